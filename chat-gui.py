@@ -1,150 +1,704 @@
 import sys
 import os
 import json
-from typing import List, Dict
+import hashlib
+import shelve
+from functools import lru_cache
+from typing import Callable, List, Dict, Optional
 import threading
+from collections import OrderedDict
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QTextEdit, QPushButton, QLabel, QSplitter, QScrollArea, QFrame,
-    QAction, QMenu
+    QTextEdit, QPushButton, QLabel, QSplitter, QFrame,
+    QAction, QMenu, QListView, QAbstractItemView, QStyledItemDelegate, QStyle
+)
+from PyQt5.QtCore import (
+    Qt, pyqtSignal as Signal, QObject, pyqtSlot as Slot,
+    QAbstractListModel, QModelIndex, QRectF, QSize, QRunnable, QThreadPool
+)
+from PyQt5.QtGui import (
+    QFont, QColor, QPalette, QFontDatabase, QIcon, QFontMetrics,
+    QPainter, QPen, QBrush, QTextDocument, QAbstractTextDocumentLayout, QKeySequence
 )
-from PyQt5.QtCore import Qt, pyqtSignal as Signal, QObject, pyqtSlot as Slot
-from PyQt5.QtGui import QFont, QColor, QPalette, QFontDatabase, QIcon
 
-import anthropic
 from dotenv import load_dotenv
 
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
 # Load environment variables from .env file
 load_dotenv()
 
+@lru_cache(maxsize=None)
+def _get_client():
+    # One client for the whole app so its connection pool is reused between messages.
+    # anthropic (with httpx and pydantic) is imported here rather than at startup.
+    import anthropic
+    return anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+MODEL = "claude-3-opus-20240229"
+
+# Responses are kept in memory only, unless CHAT_CACHE_PATH names a file to persist them in between runs
+CACHE_PATH = os.getenv("CHAT_CACHE_PATH", "")
+
+# Set CHAT_EMBED_MODEL to a Voyage AI embedding model (e.g. "voyage-3-lite") to also answer questions
+# that closely match an earlier one from the cache. Needs the voyageai package and VOYAGE_API_KEY.
+EMBED_MODEL = os.getenv("CHAT_EMBED_MODEL", "")
+SIMILARITY_THRESHOLD = float(os.getenv("CHAT_SIMILARITY_THRESHOLD", "0.9"))
+
+@lru_cache(maxsize=None)
+def _get_embed_client():
+    # Imported on first use, like anthropic in _get_client
+    import voyageai
+    return voyageai.Client()
+
+def _embed(text: str) -> List[float]:
+    return _get_embed_client().embed([text], model=EMBED_MODEL, input_type="query").embeddings[0]
+
+@lru_cache(maxsize=None)
+def _similarity_kernel():
+    # Returns scan(query, matrix, scales) -> approximate scores for an int8 query against
+    # int8 rows with per-row scales, accumulating in int32. Compiled with numba when it
+    # is installed, plain NumPy otherwise.
+    import numpy as np
+    try:
+        from numba import njit, prange
+    except ImportError:
+        def scan(query, matrix, scales):
+            return (matrix.astype(np.int32) @ query.astype(np.int32)) * scales
+        return scan
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def scan(query, matrix, scales):
+        n = matrix.shape[0]
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            acc = np.int32(0)
+            for j in range(matrix.shape[1]):
+                acc += np.int32(query[j]) * np.int32(matrix[i, j])
+            scores[i] = acc * scales[i]
+        return scores
+    return scan
+
+def _quantize(vector):
+    # Symmetric int8 quantization with a single scale for the whole vector
+    import numpy as np
+    scale = float(np.abs(vector).max()) / 127 or 1.0
+    return np.round(vector / scale).astype(np.int8), np.float32(scale)
+
+def _best_match(query, matrix, scales, full, threshold, top_k=8):
+    # Index of the stored vector most similar to the unit-length float32 query, or -1 if
+    # none reaches the threshold. The int8 scan shortlists top_k rows, which are then
+    # rescored exactly using their float32 originals in full, so quantization only
+    # affects which rows are shortlisted, never the threshold decision.
+    import numpy as np
+    q, _ = _quantize(query)
+    scores = _similarity_kernel()(q, matrix, scales)
+    if len(scores) > top_k:
+        candidates = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+        candidates = np.arange(len(scores))
+    exact = full[candidates] @ query
+    best = int(exact.argmax())
+    return int(candidates[best]) if exact[best] >= threshold else -1
+
+# Two-tier cache in front of the API: an exact tier keyed on a hash of the model and the
+# serialized message list (persisted with shelve when a path is given), and an optional
+# semantic tier that embeds the opening message of a conversation with `embed` and reuses the
+# response to the most similar earlier opening message once cosine similarity reaches `threshold`
+class ResponseCache:
+    def __init__(self, model: str, path: str = "", embed: Optional[Callable[[str], List[float]]] = None,
+                 threshold: float = 0.9):
+        self.model = model
+        self.embed = embed
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._exact = {}
+        if path:
+            try:
+                self._exact = shelve.open(path)
+            except Exception as e:
+                # e.g. locked by another running instance; the app still works without persistence
+                print(f"Could not open response cache {path}, keeping responses in memory: {e}")
+        # Semantic tier: int8-quantized embeddings (with per-row scales) fill the first _count
+        # rows of a matrix that grows geometrically and is what every lookup scans; the float32
+        # embeddings are kept alongside, but only read for the few shortlisted rows
+        self._vectors = None
+        self._scales = None
+        self._full = None
+        self._count = 0
+        self._responses = []
+        self._last_embedding = None
+
+    def key(self, history: bytes, message: Dict) -> str:
+        # history is the serialized conversation so far as an open JSON array ("[...,"),
+        # see ChatModel.serialized_history, so only the new message is serialized here
+        digest = hashlib.blake2b(self.model.encode() + b"\0")
+        digest.update(history)
+        digest.update(_dumps(message))
+        digest.update(b"]")
+        return digest.hexdigest()
+
+    def _semantic(self, messages: List[Dict]) -> bool:
+        # Only opening questions use the semantic tier: it compares the last turn alone, and a
+        # follow-up like "tell me more" means something different in every conversation
+        return self.embed is not None and len(messages) == 1
+
+    def _embedding(self, messages: List[Dict]):
+        import numpy as np
+        text = messages[-1]["content"]
+        # get() and put() for the same turn embed the same text; only pay for it once
+        last = self._last_embedding
+        if last is not None and last[0] == text:
+            return last[1]
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        self._last_embedding = (text, vector)
+        return vector
+
+    def get(self, key: str, messages: List[Dict]) -> Optional[str]:
+        with self._lock:
+            response = self._exact.get(key)
+        if response is not None or not self._semantic(messages):
+            return response
+
+        try:
+            vector = self._embedding(messages)
+        except Exception:
+            # A failed embedding only costs the semantic lookup, not the request
+            return None
+        with self._lock:
+            if not self._count:
+                return None
+            best = _best_match(vector, self._vectors[:self._count], self._scales[:self._count],
+                               self._full, self.threshold)
+            if best >= 0:
+                return self._responses[best]
+        return None
+
+    def put(self, key: str, messages: List[Dict], response: str):
+        with self._lock:
+            self._exact[key] = response
+            if isinstance(self._exact, shelve.Shelf):
+                self._exact.sync()
+        if not self._semantic(messages):
+            return
+
+        import numpy as np
+        try:
+            vector = self._embedding(messages)
+        except Exception:
+            return
+        quantized, scale = _quantize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.empty((64, vector.shape[0]), dtype=np.int8)
+                self._scales = np.empty(64, dtype=np.float32)
+                self._full = np.empty((64, vector.shape[0]), dtype=np.float32)
+            elif self._count == len(self._vectors):
+                grown = np.empty((2 * len(self._vectors), vector.shape[0]), dtype=np.int8)
+                grown[:self._count] = self._vectors
+                self._vectors = grown
+                self._scales = np.resize(self._scales, 2 * len(self._scales))
+                full = np.empty((2 * len(self._full), vector.shape[0]), dtype=np.float32)
+                full[:self._count] = self._full[:self._count]
+                self._full = full
+            self._vectors[self._count] = quantized
+            self._scales[self._count] = scale
+            self._full[self._count] = vector
+            self._count += 1
+            self._responses.append(response)
+
+    def close(self):
+        with self._lock:
+            if isinstance(self._exact, shelve.Shelf):
+                self._exact.close()
+
 # Signal class for thread communication
 class WorkerSignals(QObject):
+    chunk = Signal(str)
     finished = Signal(str)
     error = Signal(str)
 
-class AnthropicWorker(threading.Thread):
-    def __init__(self, prompt: str, message_history: List[Dict], signals: WorkerSignals):
+# Runs on the shared QThreadPool so request threads are reused rather than created per send
+class AnthropicWorker(QRunnable):
+    def __init__(self, prompt: str, message_history: List[Dict], serialized_history: bytes,
+                 signals: WorkerSignals, cache: ResponseCache):
         super().__init__()
         self.prompt = prompt
         self.message_history = message_history
+        self.serialized_history = serialized_history
         self.signals = signals
-        self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.cache = cache
         
     def run(self):
         try:
-            # Convert message history to the format expected by Anthropic
-            messages = []
-            for msg in self.message_history:
-                messages.append(msg)
+            # The history list is built fresh for this worker, so add the current prompt in place
+            messages = self.message_history
+            prompt_message = {"role": "user", "content": self.prompt}
+            messages.append(prompt_message)
             
-            # Add the current prompt
-            messages.append({"role": "user", "content": self.prompt})
+            # Answer from the cache if this conversation was seen before
+            cache_key = self.cache.key(self.serialized_history, prompt_message)
+            response_text = self.cache.get(cache_key, messages)
+            if response_text is not None:
+                self.signals.chunk.emit(response_text)
+                self.signals.finished.emit(response_text)
+                return
             
-            # Call Claude API
-            response = self.client.messages.create(
-                model="claude-3-opus-20240229",
+            # Call Claude API, forwarding text to the GUI as it is generated
+            client = _get_client()
+            parts = []
+            with client.messages.stream(
+                model=MODEL,
                 max_tokens=2000,
                 messages=messages
-            )
+            ) as stream:
+                for text in stream.text_stream:
+                    parts.append(text)
+                    self.signals.chunk.emit(text)
             
-            # Get the response text
-            response_text = response.content[0].text
+            # Cache the complete response; an empty one would be replayed instead of asking again
+            response_text = "".join(parts)
+            if response_text:
+                self.cache.put(cache_key, messages, response_text)
             
-            # Emit the signal with the response
+            # Emit the signal with the full response
             self.signals.finished.emit(response_text)
         except Exception as e:
             self.signals.error.emit(str(e))
 
-class MessageWidget(QWidget):
-    def __init__(self, message: str, is_user: bool = False, is_dark_theme: bool = False, parent=None):
+# Starts a pool thread and creates the API client in the background ahead of the first request
+class _WarmupTask(QRunnable):
+    def run(self):
+        try:
+            _get_client()
+        except Exception:
+            # Not cached on failure, so the error is reported again by the first send
+            pass
+
+# List model holding the conversation; the view only paints the rows that are visible
+class ChatModel(QAbstractListModel):
+    RoleRole = Qt.UserRole + 1
+    ContentRole = Qt.UserRole + 2
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.message = message
-        self.is_user = is_user
-        self.is_dark_theme = is_dark_theme
-        self.init_ui()
-        
-    def init_ui(self):
-        layout = QVBoxLayout()
-        layout.setContentsMargins(10, 10, 10, 10)
-        
-        # Create role label with softer styling
-        role_label = QLabel("You:" if self.is_user else "Claude:")
-        role_font = QFont()
-        role_font.setBold(True)
-        role_font.setPointSize(11)  # Increased font size
-        role_label.setFont(role_font)
-        
-        if self.is_dark_theme:
-            role_label.setStyleSheet("color: #cccccc; margin-left: 5px;")
-        else:
-            role_label.setStyleSheet("color: #555555; margin-left: 5px;")
-        
-        # Create message text box with softer styling
-        message_box = QTextEdit()
-        message_box.setReadOnly(True)
-        message_box.setText(self.message)
-        message_box.setFrameShape(QTextEdit.NoFrame)
-        
-        # Set minimum height for the message box to make it larger
-        message_box.setMinimumHeight(150)
-        
-        # Make the text box auto-expand to fit content
-        document_height = message_box.document().size().height()
-        if document_height > 150:
-            message_box.setMinimumHeight(min(document_height + 30, 400))
-        
-        # Set font size for message box
-        message_font = QFont()
-        message_font.setPointSize(11)  # Increased font size
-        message_box.setFont(message_font)
-        
-        # Set different background colors for user and assistant based on theme
-        if self.is_dark_theme:
-            if self.is_user:
-                message_box.setStyleSheet("""
-                    background-color: #3a3f44; 
-                    border-radius: 12px; 
-                    padding: 15px;
-                    color: #e0e0e0;
-                    border: 1px solid #4a4f54;
-                """)
-            else:
-                message_box.setStyleSheet("""
-                    background-color: #2d5986; 
-                    border-radius: 12px; 
-                    padding: 15px;
-                    color: #ffffff;
-                    border: 1px solid #3269a0;
-                """)
+        # Roles and contents are kept as parallel lists rather than a list of small dicts
+        self._roles = []
+        self._contents = []
+        # Laid-out text height of each row at the delegate's current width, None until measured
+        self._heights = []
+        # JSON serialization of the first _serialized_rows messages, extended as turns complete
+        self._serialized = bytearray(b"[")
+        self._serialized_rows = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._roles)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, self.ContentRole):
+            return self._contents[index.row()]
+        if role == self.RoleRole:
+            return self._roles[index.row()]
+        return None
+
+    def append_message(self, role: str, content: str):
+        row = len(self._roles)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._roles.append(role)
+        self._contents.append(content)
+        self._heights.append(None)
+        self.endInsertRows()
+
+    def append_messages(self, messages: List[Dict]):
+        # Insert all rows under a single begin/end pair so the view relayouts once
+        if not messages:
+            return
+        row = len(self._roles)
+        self.beginInsertRows(QModelIndex(), row, row + len(messages) - 1)
+        self._roles.extend(m["role"] for m in messages)
+        self._contents.extend(m["content"] for m in messages)
+        self._heights.extend([None] * len(messages))
+        self.endInsertRows()
+
+    def _invalidate_serialized(self, row: int):
+        # Editing an already serialized message means serializing from scratch next time
+        if row < self._serialized_rows:
+            self._serialized = bytearray(b"[")
+            self._serialized_rows = 0
+
+    def append_text(self, text: str):
+        # Extend the last message in place, e.g. while a response is streaming in
+        row = len(self._contents) - 1
+        self._invalidate_serialized(row)
+        self._contents[row] += text
+        self._heights[row] = None
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, self.ContentRole])
+        return index
+
+    def remove_last(self):
+        row = len(self._roles) - 1
+        self._invalidate_serialized(row)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._roles[row]
+        del self._contents[row]
+        del self._heights[row]
+        self.endRemoveRows()
+
+    def text_height(self, row: int) -> Optional[int]:
+        return self._heights[row]
+
+    def set_text_height(self, row: int, height: int):
+        self._heights[row] = height
+
+    def clear_text_heights(self):
+        # Called when the text width changes and every row has to be measured again
+        self._heights = [None] * len(self._heights)
+
+    def serialized_history(self) -> bytes:
+        # The history as an unterminated JSON array ("[{...},{...},"). Messages are only
+        # serialized once, the first time they are part of the history sent to the API.
+        for row in range(self._serialized_rows, len(self._roles)):
+            self._serialized += _dumps({"role": self._roles[row], "content": self._contents[row]}) + b","
+        self._serialized_rows = len(self._roles)
+        return bytes(self._serialized)
+
+    def history(self):
+        # Materialize the API payload in one pass; the result is a new list a worker thread can own
+        return [{"role": r, "content": c} for r, c in zip(self._roles, self._contents)]
+
+# Delegate that paints a chat bubble for each row of the ChatModel
+class BubbleDelegate(QStyledItemDelegate):
+    MARGIN = 10
+    SPACING = 5
+    PADDING = 15
+    RADIUS = 12
+
+    # Bubble colors (background, border, text) keyed by (is_user, is_dark_theme)
+    BUBBLE_COLORS = {
+        (True, True): ("#3a3f44", "#4a4f54", "#e0e0e0"),
+        (False, True): ("#2d5986", "#3269a0", "#ffffff"),
+        (True, False): ("#eeeeee", "#dddddd", "#333333"),
+        (False, False): ("#d9eaf7", "#bbd6ef", "#333333"),
+    }
+    ROLE_COLORS = {True: "#cccccc", False: "#555555"}
+
+    # Laid-out documents kept at once; enough for several screens of visible rows
+    MAX_CACHED_DOCS = 256
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.is_dark_theme = True
+
+        self.role_font = QFont()
+        self.role_font.setBold(True)
+        self.role_font.setPointSize(11)
+        self.message_font = QFont()
+        self.message_font.setPointSize(11)
+        self.role_height = QFontMetrics(self.role_font).height()
+
+        # Brushes, pens and text paint contexts only depend on (is_user, is_dark_theme),
+        # so build them once instead of on every paint
+        self._bubble_styles = {}
+        for key, (background, border, text_color) in self.BUBBLE_COLORS.items():
+            context = QAbstractTextDocumentLayout.PaintContext()
+            context.palette.setColor(QPalette.Text, QColor(text_color))
+            self._bubble_styles[key] = (QBrush(QColor(background)), QPen(QColor(border), 1), context)
+        self._role_pens = {is_dark: QPen(QColor(color)) for is_dark, color in self.ROLE_COLORS.items()}
+
+        # Laid-out documents keyed by message text, reused between sizeHint and paint, least
+        # recently used first. Rows with identical text share one document, and since documents
+        # don't depend on the theme a theme switch only repaints. The view asks every row for
+        # its size, so text heights are stored per row in the ChatModel: off-screen rows are
+        # measured once and only the rows being painted hold a document. All entries share one width.
+        self._docs = OrderedDict()
+        self._docs_width = None
+
+    def _text_width(self, option):
+        view = self.parent()
+        if view is None:
+            width = option.rect.width()
         else:
-            if self.is_user:
-                message_box.setStyleSheet("""
-                    background-color: #eeeeee; 
-                    border-radius: 12px; 
-                    padding: 15px;
-                    color: #333333;
-                    border: 1px solid #dddddd;
-                """)
-            else:
-                message_box.setStyleSheet("""
-                    background-color: #d9eaf7; 
-                    border-radius: 12px; 
-                    padding: 15px;
-                    color: #333333;
-                    border: 1px solid #bbd6ef;
-                """)
-        
-        layout.addWidget(role_label)
-        layout.addWidget(message_box)
-        layout.setSpacing(5)
-        self.setLayout(layout)
+            width = view.viewport().width() - 2 * view.spacing()
+        return max(width - 2 * (self.MARGIN + self.PADDING), 50)
+
+    def _document(self, index, width):
+        self._check_width(width, index.model())
+
+        text = index.data(ChatModel.ContentRole)
+        doc = self._docs.get(text)
+        if doc is not None:
+            self._docs.move_to_end(text)
+            return doc
+
+        doc = QTextDocument()
+        doc.setDocumentMargin(0)
+        doc.setDefaultFont(self.message_font)
+        doc.setPlainText(text)
+        doc.setTextWidth(width)
+        self._docs[text] = doc
+        if len(self._docs) > self.MAX_CACHED_DOCS:
+            self._docs.popitem(last=False)
+        return doc
+
+    def _check_width(self, width, model):
+        if width != self._docs_width:
+            self._docs.clear()
+            model.clear_text_heights()
+            self._docs_width = width
+
+    def release(self, text: str):
+        # Drop the document for text that is no longer shown, e.g. a partial streamed response
+        self._docs.pop(text, None)
+
+    def sizeHint(self, option, index):
+        width = self._text_width(option)
+        model = index.model()
+        self._check_width(width, model)
+        text_height = model.text_height(index.row())
+        if text_height is None:
+            text_height = int(self._document(index, width).size().height())
+            model.set_text_height(index.row(), text_height)
+        height = (2 * self.MARGIN + self.role_height + self.SPACING
+                  + 2 * self.PADDING + text_height)
+        return QSize(width + 2 * (self.MARGIN + self.PADDING), height)
+
+    def paint(self, painter, option, index):
+        is_user = index.data(ChatModel.RoleRole) == "user"
+        brush, pen, context = self._bubble_styles[(is_user, self.is_dark_theme)]
+        doc = self._document(index, self._text_width(option))
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        # Role label
+        rect = option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        painter.setFont(self.role_font)
+        painter.setPen(self._role_pens[self.is_dark_theme])
+        painter.drawText(rect.adjusted(5, 0, 0, 0), Qt.AlignLeft | Qt.AlignTop,
+                         "You:" if is_user else "Claude:")
+
+        # Bubble
+        bubble = QRectF(rect.adjusted(0, self.role_height + self.SPACING, 0, 0))
+        painter.setBrush(brush)
+        painter.setPen(pen)
+        painter.drawRoundedRect(bubble, self.RADIUS, self.RADIUS)
+
+        # Message text
+        painter.translate(bubble.left() + self.PADDING, bubble.top() + self.PADDING)
+        doc.documentLayout().draw(painter, context)
+
+        painter.restore()
+
+# Theme stylesheets, defined once at module level
+DARK_MAIN_QSS = """
+    QMainWindow {
+        background-color: #222222;
+        color: #ffffff;
+    }
+    QMenuBar {
+        background-color: #2d2d2d;
+        color: #ffffff;
+        border-bottom: 1px solid #3d3d3d;
+    }
+    QMenuBar::item {
+        background-color: transparent;
+        padding: 5px 10px;
+    }
+    QMenuBar::item:selected {
+        background-color: #3a3a3a;
+        border-radius: 4px;
+    }
+    QMenu {
+        background-color: #2d2d2d;
+        color: #ffffff;
+        border: 1px solid #3d3d3d;
+    }
+    QMenu::item:selected {
+        background-color: #3a3a3a;
+    }
+    QListView, QSplitter {
+        background-color: #1e1e1e;
+        border: none;
+    }
+    QLabel {
+        font-size: 15px;
+        color: #dddddd;
+    }
+    QTextEdit {
+        border-radius: 8px;
+        border: 1px solid #3d3d3d;
+        padding: 8px;
+        background-color: #2d2d2d;
+        color: #ffffff;
+        selection-background-color: #3d5c99;
+        font-size: 15px;
+    }
+    QPushButton {
+        background-color: #3d5c99;
+        color: white;
+        border-radius: 18px;
+        padding: 10px 20px;
+        font-weight: bold;
+        border: none;
+        min-width: 100px;
+        min-height: 36px;
+        font-size: 15px;
+    }
+    QPushButton:hover {
+        background-color: #496db9;
+    }
+    QPushButton:pressed {
+        background-color: #2d4c89;
+    }
+    QSplitter::handle {
+        background-color: #3d3d3d;
+        height: 2px;
+    }
+    QScrollBar:vertical {
+        border: none;
+        background-color: #2d2d2d;
+        width: 12px;
+        margin: 12px 0 12px 0;
+        border-radius: 6px;
+    }
+    QScrollBar::handle:vertical {
+        background-color: #3d3d3d;
+        min-height: 30px;
+        border-radius: 6px;
+    }
+    QScrollBar::handle:vertical:hover {
+        background-color: #4d4d4d;
+    }
+    QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
+        height: 12px;
+        background: none;
+    }
+    QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {
+        background: none;
+    }
+"""
+LIGHT_MAIN_QSS = """
+    QMainWindow {
+        background-color: #e8e8e8;
+    }
+    QMenuBar {
+        background-color: #e0e0e0;
+        border-bottom: 1px solid #cccccc;
+    }
+    QMenuBar::item {
+        padding: 5px 10px;
+    }
+    QMenuBar::item:selected {
+        background-color: #d0d0d0;
+        border-radius: 4px;
+    }
+    QMenu {
+        background-color: #f0f0f0;
+        border: 1px solid #cccccc;
+    }
+    QMenu::item:selected {
+        background-color: #e0e0e0;
+    }
+    QListView, QSplitter {
+        background-color: #f0f0f0;
+        border: none;
+    }
+    QLabel {
+        font-size: 15px;
+        color: #444444;
+    }
+    QTextEdit {
+        border-radius: 8px;
+        border: 1px solid #c0c0c0;
+        padding: 8px;
+        background-color: #ffffff;
+        color: #333333;
+        selection-background-color: #c2e0ff;
+        font-size: 15px;
+    }
+    QPushButton {
+        background-color: #5c85d6;
+        color: white;
+        border-radius: 18px;
+        padding: 10px 20px;
+        font-weight: bold;
+        border: none;
+        min-width: 100px;
+        min-height: 36px;
+        font-size: 15px;
+    }
+    QPushButton:hover {
+        background-color: #4a6db3;
+    }
+    QPushButton:pressed {
+        background-color: #3d5c99;
+    }
+    QSplitter::handle {
+        background-color: #cccccc;
+        height: 2px;
+    }
+    QScrollBar:vertical {
+        border: none;
+        background-color: #e0e0e0;
+        width: 12px;
+        margin: 12px 0 12px 0;
+        border-radius: 6px;
+    }
+    QScrollBar::handle:vertical {
+        background-color: #b0b0b0;
+        min-height: 30px;
+        border-radius: 6px;
+    }
+    QScrollBar::handle:vertical:hover {
+        background-color: #999999;
+    }
+    QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
+        height: 12px;
+        background: none;
+    }
+    QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {
+        background: none;
+    }
+"""
+DARK_CHAT_QSS = "background-color: #1e1e1e;"
+LIGHT_CHAT_QSS = "background-color: #f0f0f0;"
+DARK_INPUT_QSS = "background-color: #1e1e1e; border-radius: 12px; border: 1px solid #3d3d3d;"
+LIGHT_INPUT_QSS = "background-color: #f0f0f0; border-radius: 12px; border: 1px solid #d5d5d5;"
+DARK_STATUS_QSS = "color: #aaaaaa; font-style: italic;"
+LIGHT_STATUS_QSS = "color: #888888; font-style: italic;"
+DARK_ERROR_QSS = "color: #ff6b6b; font-weight: bold;"
+LIGHT_ERROR_QSS = "color: #e74c3c; font-weight: bold;"
 
 class ChatBotWindow(QMainWindow):
+    # Style icons, looked up once and shared by all windows
+    _SEND_ICON = None
+    
     def __init__(self):
         super().__init__()
-        self.message_history = []
         self.is_dark_theme = True  # Default to dark theme
+        self.response_cache = ResponseCache(MODEL, CACHE_PATH, _embed if EMBED_MODEL else None,
+                                            SIMILARITY_THRESHOLD)
+        self._autoscroll = True
+        
+        # Bounded worker pool; warm one thread now so the first send doesn't pay for its creation,
+        # and keep idle threads alive (Qt expires them after 30s) so later sends don't either
+        self.thread_pool = QThreadPool.globalInstance()
+        self.thread_pool.setMaxThreadCount(4)
+        self.thread_pool.setExpiryTimeout(-1)
+        self.thread_pool.start(_WarmupTask())
+        
         self.init_ui()
         
     def init_ui(self):
@@ -157,19 +711,31 @@ class ChatBotWindow(QMainWindow):
         self.main_layout.setContentsMargins(20, 20, 20, 20)
         self.main_layout.setSpacing(15)
         
-        # Chat history area with softer styling
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.scroll_area.setFrameShape(QFrame.NoFrame)
-        
-        self.chat_widget = QWidget()
-        self.chat_layout = QVBoxLayout(self.chat_widget)
-        self.chat_layout.setContentsMargins(15, 15, 15, 15)
-        self.chat_layout.setSpacing(15)
-        self.chat_layout.addStretch()
-        
-        self.scroll_area.setWidget(self.chat_widget)
+        # Chat history area: a list view over the chat model, painted by the bubble delegate
+        self.chat_model = ChatModel(self)
+        self.chat_view = QListView()
+        self.chat_view.setModel(self.chat_model)
+        self.chat_delegate = BubbleDelegate(self.chat_view)
+        self.chat_view.setItemDelegate(self.chat_delegate)
+        self.chat_view.setUniformItemSizes(False)
+        self.chat_view.setResizeMode(QListView.Adjust)
+        self.chat_view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.chat_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.chat_view.setSelectionMode(QAbstractItemView.NoSelection)
+        self.chat_view.setFrameShape(QFrame.NoFrame)
+        self.chat_view.setSpacing(5)
+        
+        # Ctrl+C copies the message under the cursor, since bubbles are painted rather than widgets
+        copy_action = QAction("Copy", self.chat_view)
+        copy_action.setShortcut(QKeySequence.Copy)
+        copy_action.setShortcutContext(Qt.WidgetShortcut)
+        copy_action.triggered.connect(self.copy_current_message)
+        self.chat_view.addAction(copy_action)
+        
+        # Follow the end of the conversation as it grows, unless the user has scrolled up
+        scroll_bar = self.chat_view.verticalScrollBar()
+        scroll_bar.rangeChanged.connect(self._on_scroll_range_changed)
+        scroll_bar.valueChanged.connect(self._on_scroll_value_changed)
         
         # Input area with softer styling
         self.input_widget = QWidget()
@@ -193,7 +759,9 @@ class ChatBotWindow(QMainWindow):
         
         # Send button
         self.send_button = QPushButton("Send")
-        self.send_button.setIcon(self.style().standardIcon(self.style().SP_CommandLink))
+        if ChatBotWindow._SEND_ICON is None:
+            ChatBotWindow._SEND_ICON = self.style().standardIcon(QStyle.SP_CommandLink)
+        self.send_button.setIcon(ChatBotWindow._SEND_ICON)
         self.send_button.setCursor(Qt.PointingHandCursor)
         self.send_button.clicked.connect(self.send_message)
         
@@ -215,7 +783,7 @@ class ChatBotWindow(QMainWindow):
         
         # Add widgets to main layout
         self.splitter = QSplitter(Qt.Vertical)
-        self.splitter.addWidget(self.scroll_area)
+        self.splitter.addWidget(self.chat_view)
         self.splitter.addWidget(self.input_widget)
         self.splitter.setSizes([650, 150])
         
@@ -231,6 +799,7 @@ class ChatBotWindow(QMainWindow):
         
         # Set up signals
         self.worker_signals = WorkerSignals()
+        self.worker_signals.chunk.connect(self.process_chunk)
         self.worker_signals.finished.connect(self.process_response)
         self.worker_signals.error.connect(self.show_error)
     
@@ -255,248 +824,92 @@ class ChatBotWindow(QMainWindow):
     
     def apply_theme(self, is_dark=False):
         self.is_dark_theme = is_dark
+        self.chat_delegate.is_dark_theme = is_dark
+        self.chat_view.viewport().update()
         
-        if is_dark:
-            # Dark theme stylesheet
-            self.setStyleSheet("""
-                QMainWindow {
-                    background-color: #222222;
-                    color: #ffffff;
-                }
-                QMenuBar {
-                    background-color: #2d2d2d;
-                    color: #ffffff;
-                    border-bottom: 1px solid #3d3d3d;
-                }
-                QMenuBar::item {
-                    background-color: transparent;
-                    padding: 5px 10px;
-                }
-                QMenuBar::item:selected {
-                    background-color: #3a3a3a;
-                    border-radius: 4px;
-                }
-                QMenu {
-                    background-color: #2d2d2d;
-                    color: #ffffff;
-                    border: 1px solid #3d3d3d;
-                }
-                QMenu::item:selected {
-                    background-color: #3a3a3a;
-                }
-                QScrollArea, QSplitter, QWidget#chat_widget {
-                    background-color: #1e1e1e;
-                    border: none;
-                }
-                QLabel {
-                    font-size: 15px;
-                    color: #dddddd;
-                }
-                QTextEdit {
-                    border-radius: 8px;
-                    border: 1px solid #3d3d3d;
-                    padding: 8px;
-                    background-color: #2d2d2d;
-                    color: #ffffff;
-                    selection-background-color: #3d5c99;
-                    font-size: 15px;
-                }
-                QPushButton {
-                    background-color: #3d5c99;
-                    color: white;
-                    border-radius: 18px;
-                    padding: 10px 20px;
-                    font-weight: bold;
-                    border: none;
-                    min-width: 100px;
-                    min-height: 36px;
-                    font-size: 15px;
-                }
-                QPushButton:hover {
-                    background-color: #496db9;
-                }
-                QPushButton:pressed {
-                    background-color: #2d4c89;
-                }
-                QSplitter::handle {
-                    background-color: #3d3d3d;
-                    height: 2px;
-                }
-                QScrollBar:vertical {
-                    border: none;
-                    background-color: #2d2d2d;
-                    width: 12px;
-                    margin: 12px 0 12px 0;
-                    border-radius: 6px;
-                }
-                QScrollBar::handle:vertical {
-                    background-color: #3d3d3d;
-                    min-height: 30px;
-                    border-radius: 6px;
-                }
-                QScrollBar::handle:vertical:hover {
-                    background-color: #4d4d4d;
-                }
-                QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                    height: 12px;
-                    background: none;
-                }
-                QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {
-                    background: none;
-                }
-            """)
-            
-            # Style the chat widget background
-            self.chat_widget.setStyleSheet("background-color: #1e1e1e;")
-            
-            # Style the input widget
-            self.input_widget.setStyleSheet("background-color: #1e1e1e; border-radius: 12px; border: 1px solid #3d3d3d;")
-            
-            # Style the status label
-            self.status_label.setStyleSheet("color: #aaaaaa; font-style: italic;")
-        else:
-            # Light theme stylesheet - with darker trim
-            self.setStyleSheet("""
-                QMainWindow {
-                    background-color: #e8e8e8;
-                }
-                QMenuBar {
-                    background-color: #e0e0e0;
-                    border-bottom: 1px solid #cccccc;
-                }
-                QMenuBar::item {
-                    padding: 5px 10px;
-                }
-                QMenuBar::item:selected {
-                    background-color: #d0d0d0;
-                    border-radius: 4px;
-                }
-                QMenu {
-                    background-color: #f0f0f0;
-                    border: 1px solid #cccccc;
-                }
-                QMenu::item:selected {
-                    background-color: #e0e0e0;
-                }
-                QScrollArea, QSplitter {
-                    background-color: #f0f0f0;
-                    border: none;
-                }
-                QLabel {
-                    font-size: 15px;
-                    color: #444444;
-                }
-                QTextEdit {
-                    border-radius: 8px;
-                    border: 1px solid #c0c0c0;
-                    padding: 8px;
-                    background-color: #ffffff;
-                    color: #333333;
-                    selection-background-color: #c2e0ff;
-                    font-size: 15px;
-                }
-                QPushButton {
-                    background-color: #5c85d6;
-                    color: white;
-                    border-radius: 18px;
-                    padding: 10px 20px;
-                    font-weight: bold;
-                    border: none;
-                    min-width: 100px;
-                    min-height: 36px;
-                    font-size: 15px;
-                }
-                QPushButton:hover {
-                    background-color: #4a6db3;
-                }
-                QPushButton:pressed {
-                    background-color: #3d5c99;
-                }
-                QSplitter::handle {
-                    background-color: #cccccc;
-                    height: 2px;
-                }
-                QScrollBar:vertical {
-                    border: none;
-                    background-color: #e0e0e0;
-                    width: 12px;
-                    margin: 12px 0 12px 0;
-                    border-radius: 6px;
-                }
-                QScrollBar::handle:vertical {
-                    background-color: #b0b0b0;
-                    min-height: 30px;
-                    border-radius: 6px;
-                }
-                QScrollBar::handle:vertical:hover {
-                    background-color: #999999;
-                }
-                QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                    height: 12px;
-                    background: none;
-                }
-                QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {
-                    background: none;
-                }
-            """)
-            
-            # Style the chat widget background
-            self.chat_widget.setStyleSheet("background-color: #f0f0f0;")
-            
-            # Style the input widget
-            self.input_widget.setStyleSheet("background-color: #f0f0f0; border-radius: 12px; border: 1px solid #d5d5d5;")
-            
-            # Style the status label
-            self.status_label.setStyleSheet("color: #888888; font-style: italic;")
+        self.setStyleSheet(DARK_MAIN_QSS if is_dark else LIGHT_MAIN_QSS)
+        self.chat_view.setStyleSheet(DARK_CHAT_QSS if is_dark else LIGHT_CHAT_QSS)
+        self.input_widget.setStyleSheet(DARK_INPUT_QSS if is_dark else LIGHT_INPUT_QSS)
+        self.status_label.setStyleSheet(DARK_STATUS_QSS if is_dark else LIGHT_STATUS_QSS)
     
     def send_message(self):
         prompt = self.prompt_text.toPlainText().strip()
         if not prompt:
             return
             
-        # Show the user message
+        # Take the history before the new turn; the worker appends the prompt itself
+        history = self.chat_model.history()
+        serialized_history = self.chat_model.serialized_history()
+        
+        # Show the user message, jumping back to the end if the user had scrolled up
+        self._autoscroll = True
         self.add_message(prompt, is_user=True)
         
         # Clear the input field
         self.prompt_text.clear()
         
-        # Update status
+        # Add an empty assistant message that the streamed response fills in
+        self.add_message("", is_user=False)
+        
+        # Update status; one response at a time since chunks go to the last message
         self.status_label.setText("Thinking...")
+        self.send_button.setEnabled(False)
         
-        # Create a worker thread for API call
-        worker = AnthropicWorker(prompt, self.message_history, self.worker_signals)
-        worker.daemon = True
-        worker.start()
+        # Run the API call on the worker pool
+        worker = AnthropicWorker(prompt, history, serialized_history, self.worker_signals,
+                                 self.response_cache)
+        self.thread_pool.start(worker)
         
     @Slot(str)
-    def process_response(self, response_text):
-        # Add the response to the chat
-        self.add_message(response_text, is_user=False)
+    def process_chunk(self, text):
+        # Append streamed text to the in-flight assistant message and let the view resize it
+        last = self.chat_model.index(self.chat_model.rowCount() - 1)
+        self.chat_delegate.release(last.data(ChatModel.ContentRole))
+        index = self.chat_model.append_text(text)
+        self.chat_delegate.sizeHintChanged.emit(index)
         
-        # Clear status
+    @Slot(str)
+    def process_response(self, response_text):
+        # The text has already arrived through process_chunk; just clear status
         self.status_label.setText("")
+        self.send_button.setEnabled(True)
         
     @Slot(str)
     def show_error(self, error_text):
+        # Drop the assistant placeholder if nothing was streamed into it
+        last = self.chat_model.index(self.chat_model.rowCount() - 1)
+        if last.isValid() and last.data(ChatModel.RoleRole) == "assistant" and not last.data(ChatModel.ContentRole):
+            self.chat_model.remove_last()
+        self.send_button.setEnabled(True)
+        
         self.status_label.setText(f"Error: {error_text}")
-        if self.is_dark_theme:
-            self.status_label.setStyleSheet("color: #ff6b6b; font-weight: bold;")
-        else:
-            self.status_label.setStyleSheet("color: #e74c3c; font-weight: bold;")
+        self.status_label.setStyleSheet(DARK_ERROR_QSS if self.is_dark_theme else LIGHT_ERROR_QSS)
         
     def add_message(self, message: str, is_user: bool = False):
-        # Add message to UI
-        message_widget = MessageWidget(message, is_user, self.is_dark_theme)
-        self.chat_layout.insertWidget(self.chat_layout.count() - 1, message_widget)
-        
-        # Add message to history
+        # Add message to the chat model (and thereby the history sent to the API)
         role = "user" if is_user else "assistant"
-        self.message_history.append({"role": role, "content": message})
-        
-        # Scroll to bottom
-        self.scroll_area.verticalScrollBar().setValue(
-            self.scroll_area.verticalScrollBar().maximum()
-        )
+        self.chat_model.append_message(role, message)
+    
+    def add_messages(self, messages: List[Dict]):
+        # Bulk import (e.g. restoring a conversation) with a single relayout and paint
+        self.chat_view.setUpdatesEnabled(False)
+        try:
+            self.chat_model.append_messages(messages)
+        finally:
+            self.chat_view.setUpdatesEnabled(True)
+    
+    def _on_scroll_range_changed(self, minimum, maximum):
+        # Called once the view has laid out new content, so maximum is already up to date
+        if self._autoscroll:
+            self.chat_view.verticalScrollBar().setValue(maximum)
+    
+    def _on_scroll_value_changed(self, value):
+        self._autoscroll = value == self.chat_view.verticalScrollBar().maximum()
+    
+    def copy_current_message(self):
+        index = self.chat_view.currentIndex()
+        if index.isValid():
+            QApplication.clipboard().setText(index.data(ChatModel.ContentRole))
 
 def main():
     app = QApplication(sys.argv)
@@ -507,6 +920,7 @@ def main():
     # Create and show the window
     window = ChatBotWindow()
     window.show()
+    app.aboutToQuit.connect(window.response_cache.close)
     
     sys.exit(app.exec_())
 
@@ -1,18 +1,66 @@
 import sys
-import threading
+import time
+import requests
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout,
                              QTextEdit, QPushButton, QLineEdit,
                              QHBoxLayout, QLabel, QComboBox)
-from PyQt5.QtCore import Qt, pyqtSignal, QObject
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtCore import Qt, pyqtSignal, QObject, QRunnable, QThreadPool
 from model_handler import ModelHandler
 
+# Seconds a fetched model list is reused before /api/tags is queried again
+TAGS_CACHE_TTL = 5
+
+# (connect, read) timeouts in seconds for fetching the model list
+TAGS_TIMEOUT = (3.05, 10)
+
+# Maximum number of paragraphs kept in the chat history display
+MAX_HISTORY_BLOCKS = 2000
+
+# Widget stylesheets for the dark theme
+WINDOW_QSS = "background-color: #1E1E1E; color: #ADD8E6;"
+LABEL_QSS = "color: #ADD8E6;"
+SELECTOR_QSS = "background-color: #333333; color: #ADD8E6; padding: 5px;"
+REFRESH_QSS = "background-color: #333333; padding: 5px;"
+TEXT_AREA_QSS = "background-color: #2D2D2D; border: 1px solid #555555; padding: 10px;"
+SEND_BUTTON_QSS = "background-color: #0078D4; color: white; padding: 10px; border: none;"
+STATUS_QSS = "color: #888888; font-style: italic;"
+
 # Create a signal class for thread communication
 class WorkerSignals(QObject):
+    chunk = pyqtSignal(str)
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
 
-# Worker thread to handle API requests
-class ModelWorker(threading.Thread):
+# Signals carrying the model list fetched from Ollama
+class ModelListSignals(QObject):
+    finished = pyqtSignal(list)
+    error = pyqtSignal(str)
+
+# Worker task to fetch the available models without blocking the UI thread
+class ModelListWorker(QRunnable):
+    def __init__(self, session, signals):
+        super().__init__()
+        self.session = session
+        self.signals = signals
+        
+    def run(self):
+        try:
+            response = self.session.get("http://localhost:11434/api/tags", timeout=TAGS_TIMEOUT)
+            
+            if response.status_code == 200:
+                # Full model names including tags
+                models = response.json().get("models", [])
+                self.signals.finished.emit([model.get("name") for model in models])
+            else:
+                self.signals.error.emit(f"Error fetching models: Status code {response.status_code}")
+                
+        except Exception as e:
+            self.signals.error.emit(f"Error connecting to Ollama API: {str(e)}\n"
+                                    "Make sure Ollama is running ('ollama serve')")
+
+# Worker task to handle API requests on the shared thread pool
+class ModelWorker(QRunnable):
     def __init__(self, model_handler, prompt, model_name, signals):
         super().__init__()
         self.model_handler = model_handler
@@ -22,15 +70,18 @@ class ModelWorker(threading.Thread):
         
     def run(self):
         try:
-            # Set the model name if needed
-            if self.model_name != self.model_handler.model_name:
+            # Set the model name if needed (the list may still be loading, in which case keep the default)
+            if self.model_name and self.model_name != self.model_handler.model_name:
                 self.model_handler.model_name = self.model_name
                 
-            # Get response from model
-            response = self.model_handler.get_response(self.prompt)
+            # Stream the response from the model, passing each piece on as it arrives
+            parts = []
+            for text in self.model_handler.stream_response(self.prompt):
+                parts.append(text)
+                self.signals.chunk.emit(text)
             
-            # Emit finished signal with the response
-            self.signals.finished.emit(response)
+            # Emit finished signal with the full response
+            self.signals.finished.emit("".join(parts))
         except Exception as e:
             # Emit error signal
             self.signals.error.emit(str(e))
@@ -40,18 +91,35 @@ class ChatbotGUI(QWidget):
         super().__init__()
         self.setWindowTitle("Local LLM Chatbot - Ollama API")
         self.setGeometry(100, 100, 800, 600)  # Adjust size as needed
-        self.setStyleSheet("background-color: #1E1E1E; color: #ADD8E6;") # Dark theme
+        self.setStyleSheet(WINDOW_QSS) # Dark theme
+        
+        # Initialize the model handler; the model is preloaded once the model list has been
+        # fetched and one is selected, rather than loading the default first
+        self.model_handler = ModelHandler(preload=False)
+        self._preloaded_model = None
         
-        # Initialize the model handler
-        self.model_handler = ModelHandler()
+        # Shared HTTP session so model list refreshes reuse the keep-alive connection
+        self.session = requests.Session()
         
         # Initialize worker signals
         self.worker_signals = WorkerSignals()
+        self.worker_signals.chunk.connect(self.handle_chunk)
         self.worker_signals.finished.connect(self.handle_response)
         self.worker_signals.error.connect(self.handle_error)
         
-        # Initialize current worker
+        # Initialize current worker and the pool it runs on
         self.current_worker = None
+        self.response_started = False
+        self.thread_pool = QThreadPool.globalInstance()
+        self.thread_pool.setMaxThreadCount(4)
+        self.thread_pool.setExpiryTimeout(-1)  # Keep idle threads for reuse instead of recreating them
+        
+        # Model list fetching: results are reused for a few seconds and only one fetch runs at a time
+        self.model_list_signals = ModelListSignals()
+        self.model_list_signals.finished.connect(self.handle_model_list)
+        self.model_list_signals.error.connect(self.handle_model_list_error)
+        self._tags_cache = (None, [])
+        self._tags_pending = False
         
         self.init_ui()
         
@@ -62,12 +130,12 @@ class ChatbotGUI(QWidget):
         # Create the model selection area
         model_layout = QHBoxLayout()
         model_label = QLabel("Model:")
-        model_label.setStyleSheet("color: #ADD8E6;")
+        model_label.setStyleSheet(LABEL_QSS)
         self.model_selector = QComboBox()
-        self.model_selector.setStyleSheet("background-color: #333333; color: #ADD8E6; padding: 5px;")
+        self.model_selector.setStyleSheet(SELECTOR_QSS)
         self.populate_model_selector()
         model_refresh = QPushButton("Refresh")
-        model_refresh.setStyleSheet("background-color: #333333; padding: 5px;")
+        model_refresh.setStyleSheet(REFRESH_QSS)
         model_refresh.clicked.connect(self.populate_model_selector)
         
         model_layout.addWidget(model_label)
@@ -77,19 +145,21 @@ class ChatbotGUI(QWidget):
         # Chat history display
         self.response_window = QTextEdit()
         self.response_window.setReadOnly(True)
-        self.response_window.setStyleSheet("background-color: #2D2D2D; border: 1px solid #555555; padding: 10px;")
+        self.response_window.setStyleSheet(TEXT_AREA_QSS)
+        # Bound the history; the oldest paragraphs are dropped once the limit is reached
+        self.response_window.document().setMaximumBlockCount(MAX_HISTORY_BLOCKS)
         
         # Create the prompt input area
         prompt_layout = QHBoxLayout()
         self.prompt_window = QTextEdit()
-        self.prompt_window.setStyleSheet("background-color: #2D2D2D; border: 1px solid #555555; padding: 10px;")
+        self.prompt_window.setStyleSheet(TEXT_AREA_QSS)
         self.prompt_window.setFixedHeight(100)
         
         # Enable Enter key to send message
         self.prompt_window.installEventFilter(self)
         
         self.send_button = QPushButton("Send")
-        self.send_button.setStyleSheet("background-color: #0078D4; color: white; padding: 10px; border: none;")
+        self.send_button.setStyleSheet(SEND_BUTTON_QSS)
         self.send_button.clicked.connect(self.send_message)
         
         prompt_layout.addWidget(self.prompt_window, 4)
@@ -97,7 +167,7 @@ class ChatbotGUI(QWidget):
         
         # Status indicator
         self.status_label = QLabel("")
-        self.status_label.setStyleSheet("color: #888888; font-style: italic;")
+        self.status_label.setStyleSheet(STATUS_QSS)
         
         # Add everything to the main layout
         main_layout.addLayout(model_layout)
@@ -107,10 +177,10 @@ class ChatbotGUI(QWidget):
         
         self.setLayout(main_layout)
         
-        # Welcome message
-        self.response_window.append("Welcome to the Local LLM Chatbot!")
-        self.response_window.append("Using Ollama API for inference.")
-        self.response_window.append("Type a prompt below and click Send.\n")
+        # Welcome message, set in one go so the document is laid out once
+        self.response_window.setPlainText("Welcome to the Local LLM Chatbot!\n"
+                                          "Using Ollama API for inference.\n"
+                                          "Type a prompt below and click Send.\n")
         
     def eventFilter(self, obj, event):
         if obj is self.prompt_window and event.type() == event.KeyPress:
@@ -124,42 +194,54 @@ class ChatbotGUI(QWidget):
         
     def populate_model_selector(self):
         """Fetch available models from Ollama and populate the dropdown."""
-        try:
-            import requests
-            response = requests.get("http://localhost:11434/api/tags")
+        timestamp, model_names = self._tags_cache
+        if timestamp is not None and time.monotonic() - timestamp < TAGS_CACHE_TTL:
+            self.set_models(model_names)
+            return
+        
+        # Fetch on the worker pool; repeated clicks while a fetch is running share its result
+        if not self._tags_pending:
+            self._tags_pending = True
+            self.thread_pool.start(ModelListWorker(self.session, self.model_list_signals))
+    
+    def handle_model_list(self, model_names):
+        """Cache the fetched model list and show it."""
+        self._tags_pending = False
+        self._tags_cache = (time.monotonic(), model_names)
+        self.set_models(model_names)
+    
+    def handle_model_list_error(self, error_msg):
+        """Report a failed model list fetch."""
+        self._tags_pending = False
+        self.response_window.append(error_msg)
+    
+    def set_models(self, model_names):
+        """Populate the dropdown, keeping the current selection if it is still available."""
+        # Save the current selection, or start with the model handler's model
+        current_selection = self.model_selector.currentText() or self.model_handler.model_name
+        
+        # Clear the dropdown
+        self.model_selector.clear()
+        
+        # Add available models with their full names including tags
+        self.model_selector.addItems(model_names)
+        
+        # Restore selection if possible
+        index = self.model_selector.findText(current_selection)
+        if index >= 0:
+            self.model_selector.setCurrentIndex(index)
+        elif self.model_selector.count() > 0:
+            self.model_selector.setCurrentIndex(0)
             
-            if response.status_code == 200:
-                # Save the current selection
-                current_selection = self.model_selector.currentText()
-                
-                # Clear the dropdown
-                self.model_selector.clear()
-                
-                # Add available models with their full names including tags
-                models = response.json().get("models", [])
-                model_names = [model.get("name") for model in models]
-                
-                for model in model_names:
-                    self.model_selector.addItem(model)
-                
-                # Restore selection if possible
-                index = self.model_selector.findText(current_selection)
-                if index >= 0:
-                    self.model_selector.setCurrentIndex(index)
-                elif self.model_selector.count() > 0:
-                    self.model_selector.setCurrentIndex(0)
-                    
-                # Update the model handler with the selected model
-                selected_model = self.model_selector.currentText()
-                if selected_model:
-                    self.model_handler.model_name = selected_model
-                
-            else:
-                self.response_window.append(f"Error fetching models: Status code {response.status_code}")
-                
-        except Exception as e:
-            self.response_window.append(f"Error connecting to Ollama API: {str(e)}")
-            self.response_window.append("Make sure Ollama is running ('ollama serve')")
+        # Update the model handler with the selected model
+        selected_model = self.model_selector.currentText()
+        if selected_model:
+            self.model_handler.model_name = selected_model
+            
+            # Have Ollama load the model now, so the first prompt doesn't wait for it
+            if selected_model != self._preloaded_model:
+                self._preloaded_model = selected_model
+                self.model_handler.preload_model()
 
     def send_message(self):
         prompt_text = self.prompt_window.toPlainText()
@@ -182,22 +264,38 @@ class ChatbotGUI(QWidget):
                 selected_model,
                 self.worker_signals
             )
-            self.current_worker.start()
+            self.thread_pool.start(self.current_worker)
     
-    def handle_response(self, response):
-        """Handle successful response from the model."""
-        # Clear status
-        self.status_label.setText("")
-        self.send_button.setEnabled(True)
+    def handle_chunk(self, text):
+        """Display a piece of the model's response as it streams in."""
+        # Start the response paragraph on the first piece
+        if not self.response_started:
+            selected_model = self.model_selector.currentText()
+            self.response_window.append(f"{selected_model}: ")
+            self.response_started = True
         
-        # Display response
-        selected_model = self.model_selector.currentText()
-        self.response_window.append(f"{selected_model}: {response}\n")
+        # Add the text at the end without re-laying out the whole document
+        cursor = self.response_window.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
         
         # Scroll to bottom
         self.response_window.verticalScrollBar().setValue(
             self.response_window.verticalScrollBar().maximum()
         )
+    
+    def handle_response(self, response):
+        """Handle successful response from the model."""
+        # Clear status
+        self.status_label.setText("")
+        self.send_button.setEnabled(True)
+        
+        # The text has already been displayed by handle_chunk; finish the paragraph
+        if self.response_started:
+            cursor = self.response_window.textCursor()
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText("\n")
+            self.response_started = False
         
         # Reset worker
         self.current_worker = None
@@ -207,6 +305,7 @@ class ChatbotGUI(QWidget):
         # Clear status
         self.status_label.setText("")
         self.send_button.setEnabled(True)
+        self.response_started = False
         
         # Display error
         self.response_window.append(f"Error: {error_msg}\n")
@@ -221,8 +320,13 @@ class ChatbotGUI(QWidget):
         self.current_worker = None
 
 
-if __name__ == '__main__':
+def main():
+    """Main entry point for the chatbot application."""
     app = QApplication(sys.argv)
     gui = ChatbotGUI()
     gui.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(app.exec_())
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -1,41 +1,207 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
 import requests
 import json
+import aiohttp
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# Decode JSON from bytes with orjson when it is installed
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# (connect, read) timeouts in seconds for requests to the Ollama server
+REQUEST_TIMEOUT = (3.05, 120)
+
+# Retries for connection errors and 502/503/504 responses, and for malformed response bodies,
+# waiting RETRY_BACKOFF * 2**n seconds between attempts
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.3
+
+# Nearest semantic cache entries checked for one from the current model and system prompt
+SEMANTIC_CANDIDATES = 8
+
+# Most seconds a prompt waits for a model preload to finish before being sent anyway
+PRELOAD_WAIT = 30
+
+# Seconds a server's model list is reused by new handlers before /api/tags is queried again
+TAGS_CACHE_TTL = 30
+
+# Model names last fetched from each server, as base_url -> (fetch time, names)
+_TAGS_CACHE = {}
+
+def _native_timeout():
+    """REQUEST_TIMEOUT as an httpx timeout, for the ollama clients (which are built on httpx)."""
+    import httpx
+    connect_timeout, read_timeout = REQUEST_TIMEOUT
+    return httpx.Timeout(read_timeout, connect=connect_timeout)
+
+def _env_count(name, default):
+    """Read a positive count from the environment, using default if it is unset or invalid.
+    
+    0 (Ollama's "choose automatically") and other values below 1 also give default,
+    since this process can't tell what the server chose.
+    """
+    try:
+        value = int(os.environ.get(name, default))
+    except ValueError:
+        print(f"Ignoring invalid {name}={os.environ[name]!r}, using {default}")
+        return default
+    return value if value >= 1 else default
 
 class ModelHandler:
-    def __init__(self, model_name="gemma3:4b", base_url="http://localhost:11434"):
+    def __init__(self, model_name="gemma3:4b", base_url="http://localhost:11434", cache_size=1024,
+                 cache_max_bytes=32 * 1024 * 1024, embed_model=None, similarity_threshold=0.92,
+                 keep_alive="30m", use_native=False, temperature=None, preload=True):
         """Initialize the model handler to communicate with Ollama's API server.
         
         Args:
             model_name: The name of the model to use (as loaded in Ollama)
             base_url: URL for the Ollama API server (default: http://localhost:11434)
+            cache_size: Number of responses kept in the in-memory LRU cache (0 disables it).
+                Responses are only cached when temperature is 0; with sampling enabled the
+                same prompt is meant to get a new answer each time.
+            cache_max_bytes: Memory budget for the cached responses and their keys; the least
+                recently used entries are evicted to stay within it. The semantic cache has
+                the same entry and byte limits (counting its embeddings), evicting the oldest.
+            embed_model: Ollama embedding model for the semantic cache, e.g. "nomic-embed-text".
+                When set, a prompt whose embedding has cosine similarity of at least
+                similarity_threshold to an earlier prompt gets that prompt's response.
+                Requires hnswlib. Disabled by default.
+            similarity_threshold: Minimum cosine similarity for a semantic cache hit
+            keep_alive: How long Ollama keeps the model loaded after a request, e.g. "30m",
+                or -1 to keep it loaded indefinitely. Without it the model is unloaded after
+                Ollama's default idle time and the next prompt waits for it to be reloaded.
+            use_native: Send prompts through the official ollama client (ollama-python)
+                instead of building the HTTP requests here. Recommended for batch workloads.
+                Requires the ollama package.
+            temperature: Sampling temperature sent with every prompt, or None for the
+                model's default (0.8 for most models). Use 0 for repeatable, cacheable answers.
+            preload: Load the model in the background at startup and whenever model_name
+                changes, so the first prompt doesn't wait for it. Pass False to preload only
+                when preload_model() is called, e.g. once the model to use is known.
         """
+        self.keep_alive = keep_alive
+        self.temperature = temperature
+        self.system_prompt = None
+        
+        # Set while no model preload is in progress (see preload_model)
+        self.preload = preload
+        self._warmed = threading.Event()
+        self._warmed.set()
+        self._model_name = None
         self.model_name = model_name
         self.base_url = base_url
         self.api_endpoint = f"{base_url}/api/generate"
         
+        # Exact-match response cache, least recently used first, bounded by both entry count
+        # and total size
+        self.cache_size = cache_size
+        self.cache_max_bytes = cache_max_bytes
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._bytes_used = 0
+        self._hits = 0
+        self._misses = 0
+        
+        # Semantic cache: an HNSW index over prompt embeddings (created once the embedding
+        # size is known), with the (model, system prompt, response) for each index label,
+        # oldest first. Evicted labels are marked deleted and their slots reused
+        self.embed_model = embed_model
+        self.similarity_threshold = similarity_threshold
+        self._embed_index = None
+        self._semantic_entries = OrderedDict()
+        self._semantic_bytes = 0
+        self._semantic_free = 0
+        self._next_label = 0
+        if embed_model is not None:
+            # Fail here rather than after a response has been generated and is being cached
+            import hnswlib
+            self._hnswlib = hnswlib
+        
+        # Keep-alive session for the sync API, so requests reuse pooled connections;
+        # transient failures are retried with backoff before they reach the caller
+        retry = Retry(total=MAX_RETRIES, backoff_factor=RETRY_BACKOFF,
+                      status_forcelist=[502, 503, 504], allowed_methods=["GET", "POST"],
+                      raise_on_status=False)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry))
+        
+        # aiohttp session for the async API, created on first use (see aget_response)
+        self._session = None
+        
+        # Official ollama clients, used for generation instead of the sessions when use_native
+        # is set; the async one is created on first use, like the aiohttp session
+        self.use_native = use_native
+        self._ollama = None
+        self._aollama = None
+        if use_native:
+            import ollama
+            self._ollama = ollama.Client(host=base_url, timeout=_native_timeout())
+        
+        # Server-side concurrency, read from the same variables the Ollama server uses.
+        # Ollama serializes requests beyond these limits, so batching more adds only queueing
+        # Unset, assume one request at a time: this process can't see the server's actual setting
+        self.num_parallel = _env_count("OLLAMA_NUM_PARALLEL", 1)
+        self.max_loaded = _env_count("OLLAMA_MAX_LOADED_MODELS", 1)
+        
+        # Prompt coalescing for queue_prompt: up to max_batch prompts arriving within
+        # max_wait_ms of each other are sent together
+        self.max_batch = self.num_parallel
+        self.max_wait_ms = 10
+        self._queue = None
+        self._queue_task = None
+        self._batch_tasks = set()
+        
         # Check if the model is available
         try:
             self._check_model()
             print(f"Successfully connected to Ollama API server at {base_url}")
             print(f"Using model: {model_name}")
+            print(f"Parallel requests: {self.num_parallel}, max loaded models: {self.max_loaded}")
+            
+            # Load the model while the application starts up, so the first prompt finds it ready
+            if preload:
+                self.preload_model()
         except Exception as e:
             print(f"Error connecting to Ollama API: {e}")
             print("Make sure Ollama is running ('ollama serve') and the model is pulled")
 
     def _check_model(self):
         """Check if the model is available in Ollama."""
-        response = requests.get(f"{self.base_url}/api/tags")
-        if response.status_code != 200:
-            raise Exception(f"Failed to connect to Ollama API: {response.status_code}")
+        # Reuse a recent model list from this server instead of another round trip
+        cached = _TAGS_CACHE.get(self.base_url)
+        if cached is not None and time.monotonic() - cached[0] < TAGS_CACHE_TTL:
+            self.available_models = cached[1]
+        else:
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=REQUEST_TIMEOUT)
+            if response.status_code != 200:
+                raise Exception(f"Failed to connect to Ollama API: {response.status_code}")
+            
+            models = _loads(response.content).get("models", [])
+            self.available_models = [model.get("name") for model in models]
+            _TAGS_CACHE[self.base_url] = (time.monotonic(), self.available_models)
         
-        models = response.json().get("models", [])
-        self.available_models = [model.get("name") for model in models]
+        # Index the names for lookup: the full names, and the tagged names by base name
+        self._available_set = set(self.available_models)
+        self._by_base = defaultdict(list)
+        for name in self.available_models:
+            base_name, _, tag = name.partition(':')
+            if tag:
+                self._by_base[base_name].append(name)
         
         # Check if the exact model name is available
-        if self.model_name not in self.available_models:
+        if self.model_name not in self._available_set:
             # If not found with exact name, check if it's available with a different tag
             model_base_name = self.model_name.split(':')[0]
-            matching_models = [m for m in self.available_models if m.startswith(f"{model_base_name}:")]
+            matching_models = self._by_base.get(model_base_name, [])
             
             if matching_models:
                 print(f"Model '{self.model_name}' not found exactly, but related models exist: {matching_models}")
@@ -43,6 +209,216 @@ class ModelHandler:
                 print(f"Warning: Model '{self.model_name}' not found in Ollama.")
                 print(f"Available models: {self.available_models}")
 
+    @property
+    def model_name(self):
+        return self._model_name
+
+    @model_name.setter
+    def model_name(self, model_name):
+        previous = self._model_name
+        self._model_name = model_name
+        self._build_template()
+        
+        # Load a newly selected model ahead of its first prompt
+        if self.preload and previous is not None and model_name != previous:
+            self.preload_model()
+
+    def preload_model(self):
+        """Have Ollama load the current model in the background.
+        
+        Prompts sent before loading finishes wait for it, for up to PRELOAD_WAIT
+        seconds, so they don't queue up behind the load on the server.
+        """
+        self._warmed = threading.Event()
+        threading.Thread(target=self._warmup, args=(self.model_name, self._warmed), daemon=True).start()
+
+    def _warmup(self, model_name, warmed):
+        """Load model_name into memory, then set warmed."""
+        try:
+            # A request without a prompt makes Ollama load the model without generating anything
+            self.session.post(self.api_endpoint, json={"model": model_name, "keep_alive": self.keep_alive},
+                              timeout=REQUEST_TIMEOUT)
+        except Exception as e:
+            print(f"Error preloading model '{model_name}': {e}")
+        finally:
+            warmed.set()
+
+    def set_system_prompt(self, text):
+        """Set the system prompt sent with every following prompt.
+        
+        The system prompt is sent unchanged ahead of each user prompt, so Ollama
+        can reuse the model state it computed for it instead of processing it
+        again on every call. Pass None to clear it.
+        
+        Args:
+            text: The system prompt
+        """
+        self.system_prompt = text
+        self._build_template()
+
+    def _build_template(self):
+        """Build the parts of the /api/generate request body that are the same for every prompt."""
+        # get_response and stream_response override "stream" to read the reply as NDJSON lines;
+        # only aget_response sends this non-streaming default and reads a single JSON object
+        self._payload_template = {
+            "model": self.model_name,
+            "stream": False,  # Single JSON object, used by aget_response
+            "keep_alive": self.keep_alive,  # Keep the model loaded between prompts
+            "options": {
+                "num_predict": 1024  # Limit response length
+            }
+        }
+        if self.temperature is not None:
+            self._payload_template["options"]["temperature"] = self.temperature
+        if self.system_prompt is not None:
+            self._payload_template["system"] = self.system_prompt
+
+    def _build_payload(self, prompt):
+        """Build the /api/generate request body for a prompt."""
+        return {**self._payload_template, "prompt": prompt}
+
+    def _native_args(self, payload):
+        """Convert a request body to keyword arguments for the ollama client's generate()."""
+        return {"model": payload["model"], "prompt": payload["prompt"], "system": payload.get("system"),
+                "options": payload["options"], "keep_alive": payload["keep_alive"]}
+
+    def _cache_key(self, payload):
+        """Hash the parts of a request that determine its response."""
+        key_data = {"m": payload["model"], "s": payload.get("system"), "p": payload["prompt"],
+                    "o": payload["options"]}
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+    def _cache_get(self, key):
+        """Return the cached response for key, or None."""
+        with self._cache_lock:
+            response = self._cache.get(key)
+            if response is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+            else:
+                self._misses += 1
+            return response
+
+    def _cache_put(self, key, payload, response, embedding=None):
+        """Cache a response, evicting least recently used entries beyond cache_size or cache_max_bytes.
+        
+        If the prompt's embedding is given, the response is also added to the
+        semantic cache.
+        """
+        # Only replay generations that are meant to be deterministic; Ollama samples at its
+        # default temperature when none is given
+        if payload["options"].get("temperature") != 0:
+            return
+        with self._cache_lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._bytes_used -= self._entry_size(key, old)
+            self._cache[key] = response
+            self._bytes_used += self._entry_size(key, response)
+            while self._cache and (len(self._cache) > self.cache_size
+                                   or self._bytes_used > self.cache_max_bytes):
+                evicted_key, evicted = self._cache.popitem(last=False)
+                self._bytes_used -= self._entry_size(evicted_key, evicted)
+            
+            if embedding is not None:
+                self._semantic_add(embedding, payload["model"], payload.get("system"), response)
+
+    @staticmethod
+    def _entry_size(key, response):
+        """Bytes counted against cache_max_bytes for a cache entry."""
+        return len(key) + len(response.encode())
+
+    @staticmethod
+    def _semantic_entry_size(dim, response):
+        """Bytes counted against cache_max_bytes for a semantic cache entry (float32 vector and response)."""
+        return 4 * dim + len(response.encode())
+
+    def cache_stats(self):
+        """Return the response caches' hit and miss counts and the bytes they hold.
+        
+        Returns:
+            A dict with "hits", "misses", "entries" and "bytes" for the exact-match
+            cache, and "semantic_entries" and "semantic_bytes" for the semantic cache
+        """
+        with self._cache_lock:
+            return {"hits": self._hits, "misses": self._misses,
+                    "entries": len(self._cache), "bytes": self._bytes_used,
+                    "semantic_entries": len(self._semantic_entries),
+                    "semantic_bytes": self._semantic_bytes}
+
+    def _semantic_add(self, embedding, model_name, system_prompt, response):
+        """Add an embedding to the semantic index, evicting the oldest entries beyond the limits.
+        
+        Called with the cache lock held.
+        """
+        if self._embed_index is None:
+            self._embed_index = self._hnswlib.Index(space="cosine", dim=len(embedding))
+            self._embed_index.init_index(max_elements=1024, allow_replace_deleted=True)
+        elif (not self._semantic_free
+              and self._embed_index.get_current_count() == self._embed_index.get_max_elements()):
+            self._embed_index.resize_index(2 * self._embed_index.get_max_elements())
+        
+        # Fill the slot of an evicted entry if there is one
+        self._embed_index.add_items([embedding], [self._next_label], replace_deleted=bool(self._semantic_free))
+        if self._semantic_free:
+            self._semantic_free -= 1
+        self._semantic_entries[self._next_label] = (model_name, system_prompt, response)
+        self._semantic_bytes += self._semantic_entry_size(len(embedding), response)
+        self._next_label += 1
+        
+        while self._semantic_entries and (len(self._semantic_entries) > self.cache_size
+                                          or self._semantic_bytes > self.cache_max_bytes):
+            label, (_, _, evicted) = self._semantic_entries.popitem(last=False)
+            self._embed_index.mark_deleted(label)
+            self._semantic_free += 1
+            self._semantic_bytes -= self._semantic_entry_size(len(embedding), evicted)
+
+    def _semantic_get(self, embedding):
+        """Return the response of the most similar earlier prompt to the same model, or None."""
+        with self._cache_lock:
+            if not self._semantic_entries:
+                return None
+            # The nearest entries may belong to other models or system prompts, so look at a few
+            k = min(SEMANTIC_CANDIDATES, len(self._semantic_entries))
+            labels, distances = self._embed_index.knn_query([embedding], k=k)
+            for label, distance in zip(labels[0], distances[0]):
+                # hnswlib's cosine distance is 1 - similarity; results are nearest first
+                if 1 - distance < self.similarity_threshold:
+                    break
+                model_name, system_prompt, response = self._semantic_entries[int(label)]
+                if model_name == self.model_name and system_prompt == self.system_prompt:
+                    return response
+        return None
+
+    def _embed(self, prompt):
+        """Embed a prompt for the semantic cache, or return None if it is disabled or fails."""
+        # Sampled responses are never cached, so there is nothing to look up
+        if self.embed_model is None or self.temperature != 0:
+            return None
+        try:
+            response = self.session.post(f"{self.base_url}/api/embeddings",
+                                         json={"model": self.embed_model, "prompt": prompt},
+                                         timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            return _loads(response.content)["embedding"]
+        except Exception as e:
+            print(f"Error embedding prompt for the semantic cache: {e}")
+            return None
+
+    async def _aembed(self, prompt):
+        """Async version of _embed."""
+        if self.embed_model is None or self.temperature != 0:
+            return None
+        try:
+            session = await self._get_session()
+            async with session.post(f"{self.base_url}/api/embeddings",
+                                    json={"model": self.embed_model, "prompt": prompt}) as response:
+                response.raise_for_status()
+                return _loads(await response.read())["embedding"]
+        except Exception as e:
+            print(f"Error embedding prompt for the semantic cache: {e}")
+            return None
+
     def get_response(self, prompt):
         """Get a response from the model via Ollama API.
         
@@ -53,43 +429,304 @@ class ModelHandler:
             The model's response text
         """
         try:
-            # Create the payload - explicitly disable streaming to avoid JSON parsing issues
-            payload = {
-                "model": self.model_name,
-                "prompt": prompt,
-                "stream": False,  # Explicitly disable streaming
-                "options": {
-                    "num_predict": 1024  # Limit response length
-                }
-            }
+            payload = self._build_payload(prompt)
             
-            # Make the API request
-            response = requests.post(self.api_endpoint, json=payload)
+            # Look for a cached response to the same prompt first
+            cache_key = self._cache_key(payload)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
             
-            # Check response status
-            if response.status_code != 200:
-                return f"Error: Failed to get response (Status code: {response.status_code})"
-                
-            # Parse the response
-            try:
-                result = response.json()
-                return result.get("response", "No response generated")
-            except json.JSONDecodeError as json_err:
-                # Handle JSON parsing errors
-                print(f"JSON parsing error: {json_err}")
-                print(f"Response content: {response.text[:200]}...")  # Print first 200 chars for debugging
+            # Then for a near-duplicate of an earlier prompt
+            embedding = self._embed(prompt)
+            if embedding is not None:
+                cached = self._semantic_get(embedding)
+                if cached is not None:
+                    return cached
+            
+            # Let a preload of the model finish first
+            self._warmed.wait(PRELOAD_WAIT)
+            
+            if self._ollama is not None:
+                text = self._ollama.generate(stream=False, **self._native_args(payload))["response"]
+                if not text:
+                    return "No response generated"
+                self._cache_put(cache_key, payload, text, embedding)
+                return text
+            
+            for attempt in range(MAX_RETRIES + 1):
+                if attempt:
+                    time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
                 
-                # Try to extract response using a different approach for streaming-like responses
-                if "response" in response.text:
+                # Make the API request and join the text of the streamed NDJSON objects line by line
+                with self.session.post(self.api_endpoint, json={**payload, "stream": True},
+                                       stream=True, timeout=REQUEST_TIMEOUT) as response:
+                    
+                    # Check response status
+                    if response.status_code != 200:
+                        return f"Error: Failed to get response (Status code: {response.status_code})"
+                    
+                    parts = []
                     try:
-                        # Get the first complete JSON object
-                        first_json_str = response.text.split('}\n{')[0] + '}'
-                        partial_result = json.loads(first_json_str)
-                        return partial_result.get("response", "")
-                    except:
-                        pass
+                        for line in response.iter_lines():
+                            if line:
+                                result = _loads(line)
+                                if "error" in result:
+                                    return f"Error: {result['error']}"
+                                parts.append(result.get("response", ""))
+                    except ValueError:
+                        # A truncated or malformed line is usually transient, so ask again
+                        continue
                 
-                return "Error parsing model response. Please try again."
+                text = "".join(parts)
+                if not text:
+                    return "No response generated"
+                self._cache_put(cache_key, payload, text, embedding)
+                return text
+            
+            return "Error parsing model response. Please try again."
                 
         except Exception as e:
-            return f"Error communicating with Ollama API: {str(e)}"
\ No newline at end of file
+            return f"Error communicating with Ollama API: {str(e)}"
+
+    def stream_response(self, prompt):
+        """Stream a response from the model via Ollama API.
+        
+        Ollama sends the response as newline-delimited JSON objects while it is
+        generated; each object's text is yielded as soon as it arrives. Responses
+        come from and go into the same caches as get_response.
+        
+        Args:
+            prompt: The user's input prompt
+            
+        Yields:
+            Successive pieces of the model's response text
+        """
+        try:
+            payload = self._build_payload(prompt)
+            
+            # Look for a cached response to the same or a similar prompt first
+            cache_key = self._cache_key(payload)
+            cached = self._cache_get(cache_key)
+            embedding = None
+            if cached is None:
+                embedding = self._embed(prompt)
+                if embedding is not None:
+                    cached = self._semantic_get(embedding)
+            if cached is not None:
+                yield cached
+                return
+            
+            # Let a preload of the model finish first
+            self._warmed.wait(PRELOAD_WAIT)
+            
+            if self._ollama is not None:
+                parts = []
+                for part in self._ollama.generate(stream=True, **self._native_args(payload)):
+                    parts.append(part["response"])
+                    yield part["response"]
+                if any(parts):
+                    self._cache_put(cache_key, payload, "".join(parts), embedding)
+                return
+            
+            with self.session.post(self.api_endpoint, json={**payload, "stream": True},
+                                   stream=True, timeout=REQUEST_TIMEOUT) as response:
+                if response.status_code != 200:
+                    yield f"Error: Failed to get response (Status code: {response.status_code})"
+                    return
+                
+                parts = []
+                for line in response.iter_lines():
+                    if line:
+                        result = _loads(line)
+                        # Ollama reports failures after the headers are sent as an "error" object
+                        if "error" in result:
+                            yield f"Error: {result['error']}"
+                            return
+                        text = result.get("response", "")
+                        parts.append(text)
+                        yield text
+            
+            # Don't cache an empty response, it would be replayed instead of asking again
+            if any(parts):
+                self._cache_put(cache_key, payload, "".join(parts), embedding)
+                
+        except Exception as e:
+            yield f"Error communicating with Ollama API: {str(e)}"
+
+    def close(self):
+        """Close the HTTP session used by the sync API."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def _get_session(self):
+        """Return the aiohttp session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=32, keepalive_timeout=60)
+            connect_timeout, read_timeout = REQUEST_TIMEOUT
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def aget_response(self, prompt):
+        """Asynchronously get a response from the model via Ollama API.
+        
+        All calls share one aiohttp session, so prompts dispatched concurrently
+        (e.g. with asyncio.gather) reuse a pool of keep-alive connections. The
+        session belongs to the event loop it was created on; call aclose()
+        before that loop finishes.
+        
+        Args:
+            prompt: The user's input prompt
+            
+        Returns:
+            The model's response text
+        """
+        try:
+            payload = self._build_payload(prompt)
+            cache_key = self._cache_key(payload)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+            
+            embedding = await self._aembed(prompt)
+            if embedding is not None:
+                cached = self._semantic_get(embedding)
+                if cached is not None:
+                    return cached
+            
+            # Let a preload of the model finish first, without blocking the event loop
+            if not self._warmed.is_set():
+                await asyncio.get_running_loop().run_in_executor(None, self._warmed.wait, PRELOAD_WAIT)
+            
+            if self.use_native:
+                if self._aollama is None:
+                    import ollama
+                    self._aollama = ollama.AsyncClient(host=self.base_url, timeout=_native_timeout())
+                result = await self._aollama.generate(stream=False, **self._native_args(payload))
+                if not result["response"]:
+                    return "No response generated"
+                self._cache_put(cache_key, payload, result["response"], embedding)
+                return result["response"]
+            
+            session = await self._get_session()
+            async with session.post(self.api_endpoint, json=payload) as response:
+                if response.status != 200:
+                    return f"Error: Failed to get response (Status code: {response.status})"
+                result = _loads(await response.read())
+                if not result.get("response"):
+                    return "No response generated"
+                self._cache_put(cache_key, payload, result["response"], embedding)
+                return result["response"]
+                
+        except Exception as e:
+            return f"Error communicating with Ollama API: {str(e)}"
+
+    async def batch_get_responses(self, prompts, max_concurrency=None):
+        """Get responses for several prompts concurrently.
+        
+        At most max_concurrency requests are in flight at once. The default is
+        num_parallel (OLLAMA_NUM_PARALLEL, 1 if unset or 0), so the server's parallel
+        slots are kept busy without queueing extra requests behind them.
+        
+        Args:
+            prompts: The prompts to send
+            max_concurrency: Maximum number of simultaneous requests
+            
+        Returns:
+            The response texts, in the same order as prompts
+        """
+        if max_concurrency is None:
+            max_concurrency = self.num_parallel
+        elif max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def one(index, prompt):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await self.aget_response(prompt)
+                # Per-request latency shows when more concurrency stops helping
+                print(f"Batch prompt {index + 1}/{len(prompts)} took {time.perf_counter() - start:.2f}s")
+                return response
+        
+        return await asyncio.gather(*[one(i, p) for i, p in enumerate(prompts)])
+
+    def queue_prompt(self, prompt):
+        """Queue a prompt to be sent together with other prompts queued around the same time.
+        
+        Prompts are collected until max_batch are waiting or max_wait_ms has passed since
+        the first, then sent concurrently so Ollama can process them in one batch (given
+        enough OLLAMA_NUM_PARALLEL slots). Must be called from a running event loop.
+        
+        Args:
+            prompt: The user's input prompt
+            
+        Returns:
+            An asyncio.Future that resolves to the model's response text
+        """
+        loop = asyncio.get_running_loop()
+        if self._queue_task is None or self._queue_task.done():
+            self._queue = asyncio.Queue()
+            self._queue_task = loop.create_task(self._drain_queue())
+        future = loop.create_future()
+        self._queue.put_nowait((prompt, future))
+        return future
+
+    async def _drain_queue(self):
+        """Send queued prompts in batches and resolve their futures, until cancelled."""
+        loop = asyncio.get_running_loop()
+        # Bounds the requests in flight across all batches to the server's parallel slots
+        semaphore = asyncio.Semaphore(self.num_parallel)
+        while True:
+            batch = [await self._queue.get()]
+            
+            # Wait a short time for more prompts to share the batch
+            deadline = loop.time() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Send the batch in the background and go straight back to collecting the next one
+            task = loop.create_task(self._send_batch(batch, semaphore))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _send_batch(self, batch, semaphore):
+        """Send a batch of queued prompts concurrently, resolving each future as its response arrives."""
+        async def one(prompt, future):
+            async with semaphore:
+                response = await self.aget_response(prompt)
+            if not future.done():
+                future.set_result(response)
+        
+        try:
+            await asyncio.gather(*[one(prompt, future) for prompt, future in batch])
+        finally:
+            # If the batch was cancelled (see aclose), don't leave its callers waiting
+            for _, future in batch:
+                future.cancel()
+
+    async def aclose(self):
+        """Close the aiohttp session used by the async API."""
+        if self._queue_task is not None:
+            self._queue_task.cancel()
+            self._queue_task = None
+            while not self._queue.empty():
+                self._queue.get_nowait()[1].cancel()
+        for task in list(self._batch_tasks):
+            task.cancel()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._aollama = None